@@ -3,11 +3,431 @@ Python Debug Agent - Streamlit Web Interface
 """
 
 import streamlit as st
-import tempfile
+import google.generativeai as genai
+import ast
+import builtins
+import difflib
+import hashlib
+import json
 import os
+import re
 from pathlib import Path
-import subprocess
-import sys
+import sysconfig
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from src.worker import PythonWorker
+
+# Code execution and fixing (defined before the UI below uses it)
+@st.cache_resource(show_spinner=False)
+def get_worker():
+    """One long-lived Python worker shared by every session"""
+    return PythonWorker()
+
+
+def execute_code(code, worker=None):
+    """Execute Python code and capture output/errors"""
+    # Syntax errors don't need a subprocess: compile in-process first
+    try:
+        compile(code, '<stdin>', 'exec')
+    except (SyntaxError, ValueError, MemoryError, RecursionError) as e:
+        # MemoryError / RecursionError: the parser gave up on deep nesting
+        return {
+            "success": False,
+            "stdout": "",
+            "stderr": "".join(traceback.format_exception_only(type(e), e)),
+            "completed": True
+        }
+    
+    # Run in the shared persistent interpreter instead of a fresh process
+    result = (worker or get_worker()).run_job(code, timeout=5)
+    return {
+        "success": result.success,
+        "stdout": result.stdout,
+        "stderr": result.stderr,
+        "completed": result.completed
+    }
+
+
+class _IncompleteRun(Exception):
+    """Carries a result out of the cached function so it isn't cached"""
+    
+    def __init__(self, result):
+        super().__init__(result["stderr"])
+        self.result = result
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _execute_code_cached(code):
+    """Cache the result only if the code actually ran to completion"""
+    result = execute_code(code)
+    if not result["completed"]:
+        # st.cache_data doesn't store calls that raise
+        raise _IncompleteRun(result)
+    return result
+
+
+def execute_code_cached(code):
+    """Execute code once per distinct source; reruns reuse the result"""
+    try:
+        return _execute_code_cached(code)
+    except _IncompleteRun as e:
+        # Timeouts and worker failures say nothing about the code: retry next time
+        return e.result
+
+
+FIX_CACHE_DIR = Path(".fix_cache")
+
+# Cached fixes kept on disk; the oldest are dropped beyond this
+FIX_CACHE_MAX_ENTRIES = 500
+
+# Fenced fix plus optional trailing explanation in a Gemini response
+_FIX_RE = re.compile(r"```python\s*(.*?)```(?:.*?EXPLANATION:\s*(.*))?", re.DOTALL)
+
+# Traceback frames under these directories (stdlib, site-packages) are
+# library code, not the user's
+_LIBRARY_DIRS = tuple({
+    os.path.normcase(sysconfig.get_path(name))
+    for name in ('stdlib', 'platstdlib', 'purelib', 'platlib')
+})
+
+# File path of a traceback frame line
+_FRAME_FILE_RE = re.compile(r'^\s*File "([^"]+)"')
+
+# Final "SomeError: message" line of a traceback
+_ERR_RE = re.compile(r"^([\w.]+(?:Error|Exception)):(.*)$", re.MULTILINE)
+
+# Static part of the fixer prompt. It is sent as the system instruction so
+# every request shares the same prefix and only the code + error vary.
+FIXER_INSTRUCTIONS = """Fix the Python code the user sends. The code has an error.
+
+Provide:
+1. The corrected Python code (wrapped in ```python code blocks)
+2. A brief explanation of what was wrong and how you fixed it
+
+Format your response as:
+FIXED CODE:
+```python
+# corrected code here
+```
+
+EXPLANATION:
+Brief explanation here
+"""
+
+
+def _fix_cache_path(code):
+    """Cache file for a piece of code, keyed on its SHA-256"""
+    key = hashlib.sha256(code.encode('utf-8')).hexdigest()
+    return FIX_CACHE_DIR / f"{key}.json"
+
+
+def load_cached_fix(code):
+    """Return a previously generated, verified fix for this exact code, if any"""
+    try:
+        with open(_fix_cache_path(code), 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    # Entries written before only verified fixes were cached may not be
+    return cached if cached.get("fix_verified") else None
+
+
+def save_cached_fix(code, result):
+    """Persist a verified fix so identical code skips the Gemini round-trip"""
+    try:
+        FIX_CACHE_DIR.mkdir(exist_ok=True)
+        with open(_fix_cache_path(code), 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        _prune_fix_cache()
+    except OSError:
+        pass
+
+
+def _prune_fix_cache():
+    """Delete the oldest cached fixes once there are too many"""
+    entries = sorted(FIX_CACHE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime)
+    for path in entries[:-FIX_CACHE_MAX_ENTRIES]:
+        path.unlink(missing_ok=True)
+
+
+def _defined_names(tree):
+    """Names the code binds anywhere: assignments, defs, args, imports"""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.alias):
+            names.add((node.asname or node.name).split('.')[0])
+    return names
+
+
+def _replace_nodes(code, nodes, text):
+    """Swap the source of single-line AST nodes for new text"""
+    lines = code.splitlines(keepends=True)
+    
+    # Right-to-left, so earlier offsets on the same line stay valid
+    for node in sorted(nodes, key=lambda n: (n.lineno, n.col_offset), reverse=True):
+        if node.end_lineno != node.lineno:
+            return None
+        # AST column offsets count UTF-8 bytes
+        raw = lines[node.lineno - 1].encode('utf-8')
+        raw = raw[:node.col_offset] + text(node).encode('utf-8') + raw[node.end_col_offset:]
+        lines[node.lineno - 1] = raw.decode('utf-8')
+    
+    return ''.join(lines)
+
+
+def _is_numeric_str(node):
+    """A string literal such as '5' or '-12'"""
+    return (
+        isinstance(node, ast.Constant)
+        and isinstance(node.value, str)
+        and node.value.strip().lstrip('-').isdigit()
+    )
+
+
+def _is_int(node):
+    """An int literal (bools excluded)"""
+    return (
+        isinstance(node, ast.Constant)
+        and isinstance(node.value, int)
+        and not isinstance(node.value, bool)
+    )
+
+
+def _try_local_fix(code, error_type, error_message):
+    """
+    Fix simple, well-understood errors without calling Gemini
+    
+    Handles a misspelt name (NameError with a close match among the
+    names the code defines or builtins) and a numeric string literal
+    added to an int literal (TypeError). Returns (fixed_code, explanation)
+    or None; callers still run the fix to verify it.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    
+    if error_type == "NameError":
+        match = re.search(r"name '(\w+)' is not defined", error_message)
+        if not match:
+            return None
+        name = match.group(1)
+        known = _defined_names(tree) | set(dir(builtins))
+        close = difflib.get_close_matches(name, known, n=1, cutoff=0.8)
+        if not close:
+            return None
+        nodes = [n for n in ast.walk(tree) if isinstance(n, ast.Name) and n.id == name]
+        fixed = _replace_nodes(code, nodes, lambda n: close[0])
+        explanation = f"`{name}` is not defined; it looks like a typo for `{close[0]}`."
+    
+    elif error_type == "TypeError":
+        nodes = []
+        for n in ast.walk(tree):
+            if isinstance(n, ast.BinOp) and isinstance(n.op, ast.Add):
+                if _is_numeric_str(n.left) and _is_int(n.right):
+                    nodes.append(n.left)
+                elif _is_int(n.left) and _is_numeric_str(n.right):
+                    nodes.append(n.right)
+        if not nodes:
+            return None
+        fixed = _replace_nodes(code, nodes, lambda n: f"int({n.value!r})")
+        explanation = (
+            "A number stored as a string was added to an int. "
+            "The string is converted with int() before adding."
+        )
+    
+    else:
+        return None
+    
+    if fixed is None or fixed == code:
+        return None
+    return fixed, explanation
+
+
+def _is_library_frame(frame_line):
+    """True for traceback frames inside the stdlib or site-packages"""
+    match = _FRAME_FILE_RE.match(frame_line)
+    if not match or not os.path.isabs(match.group(1)):
+        return False
+    
+    # Compare whole path components: /usr/local/app is not under
+    # /usr/local/lib, and /usr2 is not under /usr
+    path = os.path.normcase(match.group(1))
+    for directory in _LIBRARY_DIRS:
+        try:
+            if os.path.commonpath([path, directory]) == directory:
+                return True
+        except ValueError:
+            # Different drives on Windows
+            continue
+    return False
+
+
+def _trim_traceback(stderr, max_frames=2):
+    """Keep only the last few user-code frames and the final error line"""
+    frames = []
+    tail = []
+    
+    for line in stderr.splitlines():
+        if line.startswith('  File "'):
+            frames.append([line])
+            tail = []
+        elif line.startswith('    ') and frames and not tail:
+            frames[-1].append(line)
+        elif line and not line.startswith('Traceback'):
+            tail.append(line)
+    
+    user_frames = [f for f in frames if not _is_library_frame(f[0])] or frames[-1:]
+    kept = [line for frame in user_frames[-max_frames:] for line in frame]
+    return '\n'.join(kept + tail)
+
+
+@st.cache_resource(show_spinner=False)
+def get_gemini_model(api_key):
+    """Configure Gemini once per API key and reuse the model across reruns"""
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(
+        'gemini-1.5-flash',
+        system_instruction=FIXER_INSTRUCTIONS
+    )
+
+
+def fix_code(code, api_key, preview=None):
+    """Fix code using Gemini API, streaming the fix into preview (an st.empty) if given"""
+    # Reuse an earlier fix for identical code
+    cached = load_cached_fix(code)
+    if cached is not None:
+        return cached
+    
+    # Execute original code
+    exec_result = execute_code_cached(code)
+    
+    if exec_result["success"]:
+        return {
+            "has_error": False,
+            "fixed_code": code,
+            "error_type": None,
+            "error_message": None
+        }
+    
+    # Parse error
+    stderr = exec_result["stderr"]
+    error_type = "Unknown"
+    error_message = stderr
+    
+    # The error is almost always the last line; scan everything only if not
+    last_line = stderr.rstrip().rpartition('\n')[2]
+    match = _ERR_RE.match(last_line)
+    if match:
+        error_type, error_message = match.groups()
+        error_message = error_message.strip()
+    else:
+        matches = _ERR_RE.findall(stderr)
+        if matches:
+            error_type, error_message = matches[-1]
+            error_message = error_message.strip()
+    
+    # Simple errors are fixed locally; Gemini is only needed if that fails
+    local_fix = _try_local_fix(code, error_type, error_message)
+    if local_fix is not None:
+        fixed_code, explanation = local_fix
+        if execute_code_cached(fixed_code)["success"]:
+            result = {
+                "has_error": True,
+                "fixed_code": fixed_code,
+                "error_type": error_type,
+                "error_message": error_message,
+                "explanation": explanation,
+                "fix_verified": True
+            }
+            save_cached_fix(code, result)
+            return result
+    
+    # Use Gemini to fix
+    model = get_gemini_model(api_key)
+    
+    prompt = f"""Code:
+```python
+{code}
+```
+
+Error:
+{_trim_traceback(stderr)}
+"""
+    
+    try:
+        # Stream the response and show the fixed code as it arrives.
+        # The explanation follows the code block, so the stream is always
+        # read to the end; once the block closes, the fix is verified in
+        # the background while the explanation is still streaming.
+        parts = []
+        candidate = None
+        verification = None
+        worker = get_worker()
+        
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            for chunk in model.generate_content(prompt, stream=True):
+                parts.append(chunk.text)
+                if candidate is not None:
+                    continue
+                partial = "".join(parts)
+                if "```python" in partial:
+                    body = partial.split("```python", 1)[1]
+                    block = body.split("```", 1)[0].strip()
+                    if preview is not None:
+                        preview.code(block, language='python')
+                    if "```" in body:
+                        candidate = block
+                        verification = pool.submit(execute_code, candidate, worker)
+            if preview is not None:
+                preview.empty()
+            response_text = "".join(parts)
+            
+            # Extract fixed code and explanation in one pass
+            fixed_code = code  # fallback
+            explanation = ""
+            match = _FIX_RE.search(response_text)
+            if match:
+                fixed_code = match.group(1).strip()
+                explanation = (match.group(2) or "").strip()
+            
+            # Verify fix (usually already running or finished)
+            if verification is not None and fixed_code == candidate:
+                verify_result = verification.result()
+            else:
+                verify_result = execute_code_cached(fixed_code)
+        
+        result = {
+            "has_error": True,
+            "fixed_code": fixed_code,
+            "error_type": error_type,
+            "error_message": error_message,
+            "explanation": explanation,
+            "fix_verified": verify_result["success"]
+        }
+        # An unverified fix is not cached, so the next click asks again
+        if result["fix_verified"]:
+            save_cached_fix(code, result)
+        return result
+    
+    except Exception as e:
+        st.error(f"Error using Gemini API: {e}")
+        return {
+            "has_error": True,
+            "fixed_code": None,
+            "error_type": error_type,
+            "error_message": error_message,
+            "explanation": f"Failed to generate fix: {str(e)}"
+        }
+
 
 # Set page config
 st.set_page_config(
@@ -18,7 +438,10 @@ st.set_page_config(
 )
 
 # Custom CSS
-st.markdown("""
+@st.cache_resource
+def _css():
+    """Page stylesheet, built once per server rather than on every rerun"""
+    return """
 <style>
     .main-header {
         text-align: center;
@@ -54,7 +477,10 @@ st.markdown("""
         color: #721c24;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+
+st.markdown(_css(), unsafe_allow_html=True)
 
 # Header
 st.markdown("""
@@ -91,7 +517,9 @@ with st.sidebar:
     st.header("📊 Stats")
     if "fixes_count" not in st.session_state:
         st.session_state.fixes_count = 0
-    st.metric("Fixes Generated", st.session_state.fixes_count)
+    # A placeholder, so a fix (which reruns only its fragment) can refresh it
+    fixes_metric = st.empty()
+    fixes_metric.metric("Fixes Generated", st.session_state.fixes_count)
     
     st.divider()
     
@@ -106,86 +534,16 @@ with st.sidebar:
     Powered by Google Gemini
     """)
 
-# Main content
-tab1, tab2, tab3 = st.tabs(["📁 Upload File", "✍️ Paste Code", "📚 Examples"])
 
-with tab1:
-    st.header("Upload Python File")
-    
-    uploaded_file = st.file_uploader(
-        "Choose a Python file",
-        type=['py'],
-        help="Upload a .py file with bugs"
-    )
-    
-    if uploaded_file:
-        code = uploaded_file.read().decode('utf-8')
-        st.code(code, language='python', line_numbers=True)
-        
-        col1, col2 = st.columns([1, 4])
-        with col1:
-            if st.button("🔧 Fix Code", key="fix_upload"):
-                if not api_key:
-                    st.error("Please enter your API key in the sidebar")
-                else:
-                    with st.spinner("AI is analyzing your code..."):
-                        result = fix_code(code, api_key)
-                        st.session_state.result = result
-                        st.session_state.original_code = code
-                        st.session_state.fixes_count += 1
-                        st.rerun()
+@st.cache_data(show_spinner=False, max_entries=16)
+def _read_upload(file_id, _uploaded_file):
+    """Decode an upload once per file_id (the file itself is not hashed)"""
+    return _uploaded_file.getvalue().decode('utf-8', errors='replace')
 
-with tab2:
-    st.header("Paste Your Code")
-    
-    code_input = st.text_area(
-        "Enter Python code here",
-        height=300,
-        placeholder="# Paste your buggy Python code here\nprint(undefined_variable)",
-        help="Type or paste your Python code"
-    )
-    
-    if code_input:
-        col1, col2 = st.columns([1, 4])
-        with col1:
-            if st.button("🔧 Fix Code", key="fix_paste"):
-                if not api_key:
-                    st.error("Please enter your API key in the sidebar")
-                else:
-                    with st.spinner("AI is analyzing your code..."):
-                        result = fix_code(code_input, api_key)
-                        st.session_state.result = result
-                        st.session_state.original_code = code_input
-                        st.session_state.fixes_count += 1
-                        st.rerun()
 
-with tab3:
-    st.header("Try Example Codes")
-    
-    examples = {
-        "Undefined Variable": "print(undefined_variable)",
-        "Division by Zero": "def divide(a, b):\n    return a / b\n\nprint(divide(10, 0))",
-        "Index Error": "my_list = [1, 2, 3]\nprint(my_list[10])",
-        "Type Error": "result = '5' + 5\nprint(result)",
-    }
-    
-    selected_example = st.selectbox("Choose an example", list(examples.keys()))
-    
-    st.code(examples[selected_example], language='python')
-    
-    if st.button("🔧 Fix This Example"):
-        if not api_key:
-            st.error("Please enter your API key in the sidebar")
-        else:
-            with st.spinner("AI is analyzing..."):
-                result = fix_code(examples[selected_example], api_key)
-                st.session_state.result = result
-                st.session_state.original_code = examples[selected_example]
-                st.session_state.fixes_count += 1
-                st.rerun()
-
-# Display results
-if "result" in st.session_state:
+# Fix button + results, rendered in a fragment so clicks rerun only this part
+def show_results():
+    """Render the latest fix stored in session state"""
     st.divider()
     st.header("📊 Results")
     
@@ -232,135 +590,84 @@ if "result" in st.session_state:
         )
 
 
-def execute_code(code):
-    """Execute Python code and capture output/errors"""
-    try:
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            f.write(code)
-            temp_file = f.name
-        
-        result = subprocess.run(
-            [sys.executable, temp_file],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        
-        os.unlink(temp_file)
-        
-        return {
-            "success": result.returncode == 0,
-            "stdout": result.stdout,
-            "stderr": result.stderr
-        }
-    except subprocess.TimeoutExpired:
-        return {
-            "success": False,
-            "stdout": "",
-            "stderr": "Execution timeout"
-        }
-    except Exception as e:
-        return {
-            "success": False,
-            "stdout": "",
-            "stderr": str(e)
-        }
+def _handle_fix(code, key, preview):
+    """Run a fix and record it in session state"""
+    st.session_state.result = fix_code(code, api_key, preview)
+    st.session_state.original_code = code
+    st.session_state.result_key = key
+    st.session_state.fixes_count += 1
+    fixes_metric.metric("Fixes Generated", st.session_state.fixes_count)
 
 
-def fix_code(code, api_key):
-    """Fix code using Gemini API"""
-    import google.generativeai as genai
-    
-    # Execute original code
-    exec_result = execute_code(code)
+@st.fragment
+def fix_section(code, key, label="🔧 Fix Code"):
+    """Fix button plus its results; a click reruns only this fragment"""
+    col1, col2 = st.columns([1, 4])
+    # Full width under the button row: the fix streams in here while Gemini writes it
+    preview = st.empty()
+    with col1:
+        if st.button(label, key=key):
+            if not api_key:
+                st.error("Please enter your API key in the sidebar")
+            else:
+                with st.spinner("AI is analyzing your code..."):
+                    _handle_fix(code, key, preview)
     
-    if exec_result["success"]:
-        return {
-            "has_error": False,
-            "fixed_code": code,
-            "error_type": None,
-            "error_message": None
-        }
-    
-    # Parse error
-    stderr = exec_result["stderr"]
-    lines = stderr.strip().split('\n')
-    error_type = "Unknown"
-    error_message = stderr
-    
-    for line in reversed(lines):
-        if ':' in line and any(err in line for err in ['Error', 'Exception']):
-            parts = line.split(':', 1)
-            error_type = parts[0].strip()
-            error_message = parts[1].strip() if len(parts) > 1 else ""
-            break
-    
-    # Use Gemini to fix
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    
-    prompt = f"""Fix this Python code. The code has an error.
+    # Rendered after the handler, so a fresh result shows without a rerun
+    if st.session_state.get("result_key") == key:
+        show_results()
 
-Code:
-```python
-{code}
-```
 
-Error:
-{stderr}
+# Main content
+tab1, tab2, tab3 = st.tabs(["📁 Upload File", "✍️ Paste Code", "📚 Examples"])
 
-Provide:
-1. The corrected Python code (wrapped in ```python code blocks)
-2. A brief explanation of what was wrong and how you fixed it
+with tab1:
+    st.header("Upload Python File")
+    
+    uploaded_file = st.file_uploader(
+        "Choose a Python file",
+        type=['py'],
+        help="Upload a .py file with bugs"
+    )
+    
+    if uploaded_file:
+        code = _read_upload(uploaded_file.file_id, uploaded_file)
+        st.code(code, language='python', line_numbers=True)
+        
+        fix_section(code, key="fix_upload")
 
-Format your response as:
-FIXED CODE:
-```python
-# corrected code here
-```
+with tab2:
+    st.header("Paste Your Code")
+    
+    code_input = st.text_area(
+        "Enter Python code here",
+        height=300,
+        placeholder="# Paste your buggy Python code here\nprint(undefined_variable)",
+        help="Type or paste your Python code"
+    )
+    
+    if code_input:
+        fix_section(code_input, key="fix_paste")
 
-EXPLANATION:
-Brief explanation here
-"""
+with tab3:
+    st.header("Try Example Codes")
     
-    try:
-        response = model.generate_content(prompt)
-        response_text = response.text
-        
-        # Extract fixed code
-        fixed_code = code  # fallback
-        if "```python" in response_text:
-            start = response_text.find("```python") + 9
-            end = response_text.find("```", start)
-            if end != -1:
-                fixed_code = response_text[start:end].strip()
-        
-        # Extract explanation
-        explanation = ""
-        if "EXPLANATION:" in response_text:
-            explanation = response_text.split("EXPLANATION:")[1].strip()
-        
-        # Verify fix
-        verify_result = execute_code(fixed_code)
-        
-        return {
-            "has_error": True,
-            "fixed_code": fixed_code,
-            "error_type": error_type,
-            "error_message": error_message,
-            "explanation": explanation,
-            "fix_verified": verify_result["success"]
-        }
+    examples = {
+        "Undefined Variable": "print(undefined_variable)",
+        "Division by Zero": "def divide(a, b):\n    return a / b\n\nprint(divide(10, 0))",
+        "Index Error": "my_list = [1, 2, 3]\nprint(my_list[10])",
+        "Type Error": "result = '5' + 5\nprint(result)",
+    }
     
-    except Exception as e:
-        st.error(f"Error using Gemini API: {e}")
-        return {
-            "has_error": True,
-            "fixed_code": None,
-            "error_type": error_type,
-            "error_message": error_message,
-            "explanation": f"Failed to generate fix: {str(e)}"
-        }
+    selected_example = st.selectbox("Choose an example", list(examples.keys()))
+    
+    st.code(examples[selected_example], language='python')
+    
+    fix_section(
+        examples[selected_example],
+        key="fix_example",
+        label="🔧 Fix This Example"
+    )
 
 
 # Footer
@@ -7,28 +7,13 @@ A CPU-optimized AI agent for debugging and fixing Python code
 import argparse
 import sys
 from pathlib import Path
-from rich.console import Console
-from rich.panel import Panel
-
-from src.agent import DebugAgent
-
-console = Console()
 
 
 def main():
     """Main entry point"""
     
-    # ASCII Art Banner
-    banner = """
-    ╔═══════════════════════════════════════╗
-    ║   🐍 Python Debug Agent 🤖           ║
-    ║   AI-Powered Code Debugging          ║
-    ║   Powered by Ollama (CPU Optimized)  ║
-    ╚═══════════════════════════════════════╝
-    """
-    console.print(banner, style="cyan")
-    
-    # Parse arguments
+    # Parse arguments first: --help and usage errors exit before the
+    # heavier imports below (rich, the agent and its Ollama client)
     parser = argparse.ArgumentParser(
         description="AI Agent for debugging Python code",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -92,6 +77,19 @@ Examples:
     
     args = parser.parse_args()
     
+    from src.agent import DebugAgent
+    from src.log import console
+    
+    # ASCII Art Banner
+    banner = """
+    ╔═══════════════════════════════════════╗
+    ║   🐍 Python Debug Agent 🤖           ║
+    ║   AI-Powered Code Debugging          ║
+    ║   Powered by Ollama (CPU Optimized)  ║
+    ╚═══════════════════════════════════════╝
+    """
+    console.print(banner, style="cyan")
+    
     # Initialize agent
     try:
         agent = DebugAgent(model=args.model)
@@ -134,10 +132,7 @@ Examples:
             # Debug inline code
             console.print("\n[cyan]🔍 Debugging inline code...[/cyan]\n")
             
-            from src.code_executor import CodeExecutor
-            executor = CodeExecutor()
-            
-            success, stdout, stderr = executor.execute_code(args.code)
+            success, stdout, stderr = agent.executor.execute_code(args.code)
             
             if success:
                 console.print("[green]✓ Code runs successfully[/green]")
@@ -181,6 +176,9 @@ Examples:
         import traceback
         console.print(traceback.format_exc())
         return 1
+    
+    finally:
+        agent.close()
 
 
 if __name__ == "__main__":
@@ -2,11 +2,12 @@
 Debug Agent - Main orchestrator for debugging Python code
 """
 
+import threading
 from typing import Optional, Tuple
-from rich.console import Console
 from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TextColumn
 
+from .log import console
 from .ollama_client import OllamaClient
 from .file_handler import FileHandler
 from .code_executor import CodeExecutor
@@ -19,8 +20,6 @@ from .tools import (
     format_traceback
 )
 
-console = Console()
-
 
 class DebugAgent:
     """AI Agent for debugging and fixing Python code"""
@@ -35,13 +34,17 @@ class DebugAgent:
         """
         self.llm = OllamaClient(model=model)
         self.file_handler = FileHandler()
-        self.executor = CodeExecutor()
+        self.executor = CodeExecutor(stream_output=True)
         self.max_retries = max_retries
         
         # Check if model is available
         if not self.llm.check_model_available():
             console.print("[red]⚠ Model not available. Please pull it first.[/red]")
             console.print(f"[cyan]Run: ollama pull {model}[/cyan]")
+        else:
+            # Load the weights in the background, overlapping the first
+            # execute_file / execute_code run rather than delaying startup
+            threading.Thread(target=self.llm.warm_up, daemon=True).start()
     
     def fix_file(self, filepath: str, auto_apply: bool = False) -> bool:
         """
@@ -236,6 +239,10 @@ class DebugAgent:
         
         return explanation
     
+    def close(self):
+        """Release resources held by the agent (the code worker)"""
+        self.executor.close()
+    
     def interactive_mode(self):
         """Start interactive debugging session"""
         console.print(Panel(
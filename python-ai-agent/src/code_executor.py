@@ -2,27 +2,59 @@
 Code Executor - Safely execute Python code and capture errors
 """
 
-import subprocess
+import asyncio
+import os
+import re
 import sys
-import tempfile
-from pathlib import Path
-from typing import Optional, Tuple
-from rich.console import Console
+import tokenize
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from rich.markup import escape
 
-console = Console()
+from .log import console
+from .worker import PROCESS_GROUP, PythonWorker, kill_process_group
+
+# "line N" in a traceback frame
+_LINE_RE = re.compile(r'line (\d+)')
+
+# Final traceback line: "ValueError: message" (the message may be absent)
+_ERROR_LINE_RE = re.compile(r'^([A-Za-z_][\w.]*(?:Error|Exception|Warning))(?::\s*(.*))?$')
+
+
+# The fix loop often re-checks identical candidates, so compile each
+# distinct source only once
+@lru_cache(maxsize=64)
+def _check_syntax(code: str) -> Tuple[bool, Optional[str]]:
+    """Compile code and report whether its syntax is valid"""
+    try:
+        compile(code, '<string>', 'exec')
+        return True, None
+        
+    except SyntaxError as e:
+        error_msg = f"Syntax Error at line {e.lineno}: {e.msg}"
+        return False, error_msg
+        
+    except Exception as e:
+        error_msg = f"Validation error: {str(e)}"
+        return False, error_msg
 
 
 class CodeExecutor:
-    """Execute Python code safely in subprocess"""
+    """Execute Python code safely in a persistent worker subprocess"""
     
-    def __init__(self, timeout: int = 10):
+    def __init__(self, timeout: int = 10, stream_output: bool = False):
         """
         Initialize code executor
         
         Args:
             timeout: Max execution time in seconds
+            stream_output: Print output live while the code runs instead
+                of all at once when it finishes
         """
         self.timeout = timeout
+        self.stream_output = stream_output
+        self._worker = None
+        self._line_open = False
     
     def execute_file(self, filepath: str) -> Tuple[bool, str, str]:
         """
@@ -37,68 +69,143 @@ class CodeExecutor:
         try:
             console.print(f"[cyan]Executing: {filepath}[/cyan]")
             
-            result = subprocess.run(
-                [sys.executable, filepath],
-                capture_output=True,
-                text=True,
-                timeout=self.timeout
-            )
+            # tokenize.open honours PEP 263 coding declarations like Python does
+            with tokenize.open(filepath) as f:
+                code = f.read()
             
-            success = result.returncode == 0
-            stdout = result.stdout
-            stderr = result.stderr
-            
-            if success:
-                console.print("[green]✓ Execution successful[/green]")
-                if stdout:
-                    console.print("[dim]Output:[/dim]")
-                    console.print(stdout)
-            else:
-                console.print("[red]✗ Execution failed[/red]")
-                if stderr:
-                    console.print("[red]Error:[/red]")
-                    console.print(stderr)
+            success, stdout, stderr = self._run(code, filename=os.path.abspath(filepath))
             
+            self._report(success, stdout, stderr)
             return success, stdout, stderr
             
-        except subprocess.TimeoutExpired:
-            error_msg = f"Execution timed out after {self.timeout} seconds"
-            console.print(f"[red]{error_msg}[/red]")
-            return False, "", error_msg
-            
         except Exception as e:
             error_msg = f"Execution error: {str(e)}"
             console.print(f"[red]{error_msg}[/red]")
             return False, "", error_msg
     
+    async def execute_files(self, filepaths: List[str]) -> List[Tuple[bool, str, str]]:
+        """
+        Execute several Python files concurrently, each in its own process
+        
+        Runs at most one process per CPU at a time. Use execute_file for a
+        single run; it reuses the persistent worker instead.
+        
+        Args:
+            filepaths: Paths to Python files
+            
+        Returns:
+            List of (success, stdout, stderr) tuples, in input order
+        """
+        console.print(f"[cyan]Executing {len(filepaths)} files[/cyan]")
+        semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+        
+        async def run_one(filepath: str) -> Tuple[bool, str, str]:
+            async with semaphore:
+                try:
+                    proc = await asyncio.create_subprocess_exec(
+                        sys.executable, filepath,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.PIPE,
+                        **PROCESS_GROUP
+                    )
+                except Exception as e:
+                    return False, "", f"Execution error: {str(e)}"
+                
+                try:
+                    stdout, stderr = await asyncio.wait_for(
+                        proc.communicate(),
+                        timeout=self.timeout
+                    )
+                except asyncio.TimeoutError:
+                    kill_process_group(proc.pid)
+                    await proc.wait()
+                    return False, "", f"Execution timed out after {self.timeout} seconds"
+                
+                return (
+                    proc.returncode == 0,
+                    stdout.decode('utf-8', errors='replace'),
+                    stderr.decode('utf-8', errors='replace')
+                )
+        
+        return list(await asyncio.gather(*(run_one(p) for p in filepaths)))
+    
+    def _get_worker(self) -> PythonWorker:
+        """Persistent interpreter shared by every run, started on first use"""
+        if self._worker is None:
+            self._worker = PythonWorker()
+        return self._worker
+    
+    def _run(self, code: str, filename: str = "<stdin>") -> Tuple[bool, str, str]:
+        """Run code in the worker, echoing output as it arrives if streaming"""
+        on_output = self._echo if self.stream_output else None
+        self._line_open = False
+        return self._get_worker().run(
+            code,
+            timeout=self.timeout,
+            filename=filename,
+            on_output=on_output
+        )
+    
+    def _echo(self, stream: str, text: str):
+        """Print a chunk of live output exactly as the code wrote it"""
+        console.out(text, end="", style="red" if stream == "stderr" else None, highlight=False)
+        self._line_open = not text.endswith("\n")
+    
+    def _report(self, success: bool, stdout: str, stderr: str):
+        """Print the outcome of an execution"""
+        if self.stream_output:
+            # Output was already shown live; finish its last line if needed
+            if self._line_open:
+                console.out("")
+            if success:
+                console.print("[green]✓ Execution successful[/green]")
+            else:
+                console.print("[red]✗ Execution failed[/red]")
+            return
+        
+        # One print per report: a single markup parse and write. Output is
+        # escaped so brackets in it aren't taken for markup
+        if success:
+            report = "[green]✓ Execution successful[/green]"
+            if stdout:
+                report += f"\n[dim]Output:[/dim]\n{escape(stdout)}"
+        else:
+            report = "[red]✗ Execution failed[/red]"
+            if stderr:
+                report += f"\n[red]Error:[/red]\n{escape(stderr)}"
+        
+        console.print(report)
+    
     def execute_code(self, code: str) -> Tuple[bool, str, str]:
         """
         Execute Python code string
         
+        The source goes to the worker over its stdin pipe; nothing is
+        written to disk. Tracebacks name the code "<stdin>".
+        
         Args:
             code: Python code to execute
             
         Returns:
             Tuple of (success, stdout, stderr)
         """
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(
-            mode='w',
-            suffix='.py',
-            delete=False,
-            encoding='utf-8'
-        ) as tmp_file:
-            tmp_file.write(code)
-            tmp_path = tmp_file.name
+        console.print("[cyan]Executing code in worker[/cyan]")
         
-        try:
-            # Execute the temporary file
-            success, stdout, stderr = self.execute_file(tmp_path)
-            return success, stdout, stderr
-            
-        finally:
-            # Clean up temp file
-            Path(tmp_path).unlink(missing_ok=True)
+        # Reuse one interpreter across runs (e.g. the agent's retry loop)
+        success, stdout, stderr = self._run(code)
+        self._report(success, stdout, stderr)
+        return success, stdout, stderr
+    
+    def close(self):
+        """Shut down the persistent worker, if one was started"""
+        if self._worker is not None:
+            self._worker.close()
+            self._worker = None
+    
+    def __del__(self):
+        # Attributes may be missing if __init__ failed
+        if getattr(self, "_worker", None) is not None:
+            self.close()
     
     def validate_syntax(self, code: str) -> Tuple[bool, Optional[str]]:
         """
@@ -110,17 +217,7 @@ class CodeExecutor:
         Returns:
             Tuple of (is_valid, error_message)
         """
-        try:
-            compile(code, '<string>', 'exec')
-            return True, None
-            
-        except SyntaxError as e:
-            error_msg = f"Syntax Error at line {e.lineno}: {e.msg}"
-            return False, error_msg
-            
-        except Exception as e:
-            error_msg = f"Validation error: {str(e)}"
-            return False, error_msg
+        return _check_syntax(code)
     
     def parse_error(self, stderr: str) -> dict:
         """
@@ -145,24 +242,18 @@ class CodeExecutor:
         
         # Find error type and message (usually last line)
         for line in reversed(lines):
-            if ':' in line and any(err in line for err in [
-                'Error', 'Exception', 'Warning'
-            ]):
-                parts = line.split(':', 1)
-                error_info["type"] = parts[0].strip()
-                error_info["message"] = parts[1].strip() if len(parts) > 1 else ""
+            match = _ERROR_LINE_RE.match(line.strip())
+            if match:
+                error_info["type"] = match.group(1)
+                error_info["message"] = (match.group(2) or "").strip()
                 break
         
-        # Find line number
-        for line in lines:
-            if 'line' in line.lower():
-                try:
-                    import re
-                    match = re.search(r'line (\d+)', line)
-                    if match:
-                        error_info["line"] = int(match.group(1))
-                except:
-                    pass
+        # Find line number (the innermost frame, nearest the end, wins)
+        for line in reversed(lines):
+            match = _LINE_RE.search(line)
+            if match:
+                error_info["line"] = int(match.group(1))
+                break
         
         return error_info
     
@@ -3,24 +3,35 @@ File Handler - Read and write Python files
 """
 
 import os
+import shutil
 from pathlib import Path
-from typing import Optional
-from rich.console import Console
+from typing import Literal, Optional
 
-console = Console()
+from .log import console
+
+OverwritePolicy = Literal["ask", "skip", "force"]
+
+# Read size for streaming over file contents
+_CHUNK_SIZE = 1 << 20
+
+# Directories never searched for Python files
+_SKIP_DIRS = {'__pycache__', '.venv', 'venv', '.git', '.tox', 'node_modules'}
 
 
 class FileHandler:
     """Handle file operations for Python files"""
     
-    def __init__(self, base_dir: str = "."):
+    def __init__(self, base_dir: str = ".", overwrite_policy: OverwritePolicy = "ask"):
         """
         Initialize file handler
         
         Args:
             base_dir: Base directory for file operations
+            overwrite_policy: What create_file does when the file exists:
+                "ask" prompts, "skip" keeps it, "force" overwrites it
         """
         self.base_dir = Path(base_dir)
+        self.overwrite_policy = overwrite_policy
     
     def read_file(self, filepath: str) -> Optional[str]:
         """
@@ -35,21 +46,33 @@ class FileHandler:
         try:
             file_path = self.base_dir / filepath
             
-            if not file_path.exists():
-                console.print(f"[red]File not found: {filepath}[/red]")
-                return None
+            # One sized read plus a single decode beats text-mode's
+            # incremental decoder for whole-file reads
+            with open(file_path, 'rb') as f:
+                content = f.read().decode('utf-8')
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            # Same newline handling as text mode
+            if '\r' in content:
+                content = content.replace('\r\n', '\n').replace('\r', '\n')
             
             console.print(f"[green]✓ Read file: {filepath}[/green]")
             return content
             
+        except FileNotFoundError:
+            console.print(f"[red]File not found: {filepath}[/red]")
+            return None
+            
         except Exception as e:
             console.print(f"[red]Error reading file {filepath}: {e}[/red]")
             return None
     
-    def write_file(self, filepath: str, content: str, backup: bool = True) -> bool:
+    def write_file(
+        self,
+        filepath: str,
+        content: str,
+        backup: bool = True,
+        durable: bool = False
+    ) -> bool:
         """
         Write content to a Python file
         
@@ -57,33 +80,85 @@ class FileHandler:
             filepath: Path to the file
             content: Content to write
             backup: Create backup before writing
+            durable: Make sure the data is on disk before returning
             
         Returns:
             True if successful, False otherwise
         """
+        file_path = self.base_dir / filepath
+        tmp_path = file_path.with_name(f"{file_path.name}.tmp-{os.getpid()}")
+        
         try:
-            file_path = self.base_dir / filepath
-            
-            # Create backup if file exists
-            if backup and file_path.exists():
-                backup_path = file_path.with_suffix('.py.bak')
-                file_path.rename(backup_path)
-                console.print(f"[yellow]Created backup: {backup_path.name}[/yellow]")
-            
             # Create parent directories if needed
             file_path.parent.mkdir(parents=True, exist_ok=True)
             
-            # Write file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            # Write next to the target, then swap it in atomically: readers
+            # never see a half-written file and a failed write leaves it intact
+            self._write_bytes(tmp_path, content.encode('utf-8'), durable)
+            
+            if file_path.exists():
+                shutil.copymode(file_path, tmp_path)
+                
+                # Create backup if file exists
+                if backup:
+                    backup_path = file_path.with_suffix('.py.bak')
+                    self._backup(file_path, backup_path)
+                    console.print(f"[yellow]Created backup: {backup_path.name}[/yellow]")
+            
+            os.replace(tmp_path, file_path)
+            
+            if durable:
+                self._sync_dir(file_path.parent)
             
             console.print(f"[green]✓ Wrote file: {filepath}[/green]")
             return True
             
         except Exception as e:
+            tmp_path.unlink(missing_ok=True)
             console.print(f"[red]Error writing file {filepath}: {e}[/red]")
             return False
     
+    def _write_bytes(self, path: Path, data: bytes, durable: bool):
+        """
+        Write data to path in one call, skipping the text layer
+        
+        With durable set, the file is opened O_DSYNC where the platform has
+        it so the write itself reaches the disk; otherwise it is fsynced.
+        """
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+        dsync = getattr(os, 'O_DSYNC', 0) if durable else 0
+        
+        with os.fdopen(os.open(path, flags | dsync, 0o666), 'wb') as f:
+            f.write(data)
+            if durable and not dsync:
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def _sync_dir(self, directory: Path):
+        """Persist a rename in directory (POSIX; a no-op elsewhere)"""
+        if os.name == 'nt':
+            return
+        
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def _backup(self, file_path: Path, backup_path: Path):
+        """
+        Keep the current contents of a file under backup_path
+        
+        A hard link costs no copy; the original stays reachable through it
+        once the new file replaces file_path. Falls back to copying where
+        links aren't supported.
+        """
+        backup_path.unlink(missing_ok=True)
+        try:
+            os.link(file_path, backup_path)
+        except OSError:
+            shutil.copy2(file_path, backup_path)
+    
     def list_python_files(self, directory: str = ".") -> list[str]:
         """
         List all Python files in a directory
@@ -96,21 +171,30 @@ class FileHandler:
         """
         try:
             dir_path = self.base_dir / directory
-            python_files = list(dir_path.rglob("*.py"))
-            
-            # Filter out __pycache__ and venv
-            python_files = [
-                str(f.relative_to(self.base_dir)) 
-                for f in python_files 
-                if '__pycache__' not in str(f) and '.venv' not in str(f)
+            return [
+                os.path.relpath(path, self.base_dir)
+                for path in self._walk_python_files(dir_path)
             ]
             
-            return python_files
-            
         except Exception as e:
             console.print(f"[red]Error listing files: {e}[/red]")
             return []
     
+    def _walk_python_files(self, directory):
+        """
+        Yield .py paths under a directory, pruning skipped directories
+        
+        scandir entries carry the file type, so no per-entry stat is
+        needed, and pruned trees are never descended into.
+        """
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in _SKIP_DIRS:
+                        yield from self._walk_python_files(entry.path)
+                elif entry.name.endswith('.py'):
+                    yield entry.path
+    
     def create_file(self, filepath: str, content: str) -> bool:
         """
         Create a new Python file
@@ -126,9 +210,14 @@ class FileHandler:
         
         if file_path.exists():
             console.print(f"[yellow]File already exists: {filepath}[/yellow]")
-            response = input("Overwrite? (y/n): ")
-            if response.lower() != 'y':
+            
+            # Only prompt when no policy was chosen up front (batch runs)
+            if self.overwrite_policy == "skip":
                 return False
+            if self.overwrite_policy == "ask":
+                response = input("Overwrite? (y/n): ")
+                if response.lower() != 'y':
+                    return False
         
         return self.write_file(filepath, content, backup=False)
     
@@ -149,15 +238,36 @@ class FileHandler:
                 return {"exists": False}
             
             stat = file_path.stat()
-            content = self.read_file(filepath)
             
             return {
                 "exists": True,
                 "size": stat.st_size,
-                "lines": len(content.splitlines()) if content else 0,
+                "lines": self._count_lines(file_path),
                 "modified": stat.st_mtime,
             }
             
         except Exception as e:
             console.print(f"[red]Error getting file info: {e}[/red]")
-            return {"exists": False, "error": str(e)}
\ No newline at end of file
+            return {"exists": False, "error": str(e)}
+    
+    def _count_lines(self, file_path: Path) -> int:
+        """
+        Count lines without decoding or holding the whole file
+        
+        Args:
+            file_path: Path to the file
+            
+        Returns:
+            Number of lines (a final line without a newline counts too)
+        """
+        count = 0
+        last = b""
+        
+        with open(file_path, 'rb') as f:
+            while chunk := f.read(_CHUNK_SIZE):
+                count += chunk.count(b'\n')
+                last = chunk
+        
+        if last and not last.endswith(b'\n'):
+            count += 1
+        return count
\ No newline at end of file
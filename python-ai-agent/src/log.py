@@ -0,0 +1,8 @@
+"""
+Shared Rich console for the agent's terminal output
+"""
+
+from rich.console import Console
+
+# One instance for every module, so terminal detection runs once per process
+console = Console()
\ No newline at end of file
@@ -3,11 +3,18 @@ Ollama Client - Optimized for CPU
 Handles communication with local Ollama models
 """
 
+import sys
+import time
 import ollama
-from typing import Generator
-from rich.console import Console
+from typing import Generator, Set
 
-console = Console()
+from .log import console
+
+# Streamed tokens written between stdout flushes
+_FLUSH_EVERY = 8
+
+# How long a fetched model list is trusted, in seconds
+_MODEL_LIST_TTL = 60
 
 
 class OllamaClient:
@@ -22,6 +29,8 @@ class OllamaClient:
         """
         self.model = model
         self.client = ollama.Client()
+        self._models = None
+        self._models_fetched_at = 0.0
         
     def generate(self, prompt: str, stream: bool = True) -> str:
         """
@@ -55,7 +64,7 @@ class OllamaClient:
     
     def _generate_stream(self, prompt: str) -> str:
         """Stream response from Ollama"""
-        full_response = ""
+        parts = []
         
         try:
             stream = self.client.generate(
@@ -71,33 +80,64 @@ class OllamaClient:
             
             console.print("[cyan]AI Response:[/cyan]", end=" ")
             
-            for chunk in stream:
-                token = chunk['response']
-                full_response += token
-                console.print(token, end="")
+            # Tokens go straight to stdout: no Rich markup parsing (which
+            # would also swallow "[...]" in generated code) and one flush
+            # per few tokens instead of per token
+            for i, token in enumerate(chunk['response'] for chunk in stream):
+                parts.append(token)
+                sys.stdout.write(token)
+                if i % _FLUSH_EVERY == 0:
+                    sys.stdout.flush()
             
+            sys.stdout.flush()
             console.print()  # New line after streaming
-            return full_response
+            return "".join(parts)
             
         except Exception as e:
+            sys.stdout.flush()
             console.print(f"\n[red]Streaming error: {e}[/red]")
-            return full_response
+            return "".join(parts)
+    
+    def warm_up(self) -> bool:
+        """
+        Load the model into memory ahead of the first real request
+        
+        Ollama loads a model without generating anything when it is
+        sent an empty prompt.
+        
+        Returns:
+            True if the model was loaded
+        """
+        try:
+            self.client.generate(model=self.model, prompt="")
+            return True
+        except Exception:
+            return False
     
     def check_model_available(self) -> bool:
         """Check if the model is available locally"""
         try:
-            models = self.client.list()
-            available_models = [m['name'] for m in models.get('models', [])]
+            available_models = self._list_models()
             
             if self.model in available_models:
                 return True
             else:
                 console.print(f"[yellow]Model '{self.model}' not found![/yellow]")
-                console.print(f"[yellow]Available models: {', '.join(available_models)}[/yellow]")
+                models = ', '.join(sorted(available_models))
+                console.print(f"[yellow]Available models: {models}[/yellow]")
                 console.print(f"[cyan]Pull it with: ollama pull {self.model}[/cyan]")
                 return False
                 
         except Exception as e:
             console.print(f"[red]Error checking models: {e}[/red]")
             console.print("[yellow]Make sure Ollama is running: ollama serve[/yellow]")
-            return False
\ No newline at end of file
+            return False
+    
+    def _list_models(self) -> Set[str]:
+        """Names of local models, cached for _MODEL_LIST_TTL seconds"""
+        now = time.monotonic()
+        if self._models is None or now - self._models_fetched_at >= _MODEL_LIST_TTL:
+            models = self.client.list()
+            self._models = {m['name'] for m in models.get('models', [])}
+            self._models_fetched_at = now
+        return self._models
\ No newline at end of file
@@ -2,55 +2,22 @@
 Helper Tools and Utilities
 """
 
+import re
 from typing import Optional
-from rich.console import Console
-from rich.syntax import Syntax
 from rich.panel import Panel
 
-console = Console()
+from .log import console
 
+# Code longer than this (in characters) is displayed without highlighting
+_HIGHLIGHT_LIMIT = 4096
 
-def format_error(error_type: str, message: str, traceback: str, code: Optional[str] = None) -> str:
-    """
-    Format error information for display
-    
-    Args:
-        error_type: Type of error
-        message: Error message
-        traceback: Full traceback
-        code: Original code (optional)
-        
-    Returns:
-        Formatted error string
-    """
-    formatted = f"""
-Error Type: {error_type}
-Message: {message}
-
-Traceback:
-{traceback}
-"""
-    
-    if code:
-        formatted += f"\nOriginal Code:\n{code}"
-    
-    return formatted
+# Fenced code block: ```lang ... ``` (the language tag is optional). The
+# rest of the fence line is skipped, unless the block is a single line
+# like ```python x = 1```
+_CODE_BLOCK_RE = re.compile(r"```(?:(\w+)(?=\s))?(?:[^\n`]*\n|[^\S\n]*)(.*?)```", re.DOTALL)
 
-
-def create_prompt(task: str, code: str, error: Optional[str] = None) -> str:
-    """
-    Create optimized prompt for Ollama (CPU-friendly, concise)
-    
-    Args:
-        task: Task description (fix, analyze, create)
-        code: Python code
-        error: Error message (optional)
-        
-    Returns:
-        Formatted prompt
-    """
-    if task == "fix":
-        prompt = f"""Fix this Python code. The code has an error.
+# Prompt templates, filled in with str.format by create_prompt
+_FIX_TMPL = """Fix this Python code. The code has an error.
 
 Code:
 ```python
@@ -61,9 +28,8 @@ Error:
 {error}
 
 Provide ONLY the corrected Python code without explanations. Start directly with the code."""
-    
-    elif task == "analyze":
-        prompt = f"""Analyze this Python code and identify issues.
+
+_ANALYZE_TMPL = """Analyze this Python code and identify issues.
 
 Code:
 ```python
@@ -74,9 +40,8 @@ List issues briefly:
 1. 
 2. 
 3. """
-    
-    elif task == "create":
-        prompt = f"""Create Python code for: {code}
+
+_CREATE_TMPL = """Create Python code for: {code}
 
 Requirements:
 - Complete, working code
@@ -84,9 +49,8 @@ Requirements:
 - Add brief comments
 
 Provide ONLY the code."""
-    
-    elif task == "explain":
-        prompt = f"""Explain this error briefly:
+
+_EXPLAIN_TMPL = """Explain this error briefly:
 
 Error:
 {error}
@@ -99,11 +63,59 @@ Code:
 Provide:
 1. What caused it (1 line)
 2. How to fix it (1 line)"""
+
+_TEMPLATES = {
+    "fix": _FIX_TMPL,
+    "analyze": _ANALYZE_TMPL,
+    "create": _CREATE_TMPL,
+    "explain": _EXPLAIN_TMPL,
+}
+
+
+def format_error(error_type: str, message: str, traceback: str, code: Optional[str] = None) -> str:
+    """
+    Format error information for display
+    
+    Args:
+        error_type: Type of error
+        message: Error message
+        traceback: Full traceback
+        code: Original code (optional)
+        
+    Returns:
+        Formatted error string
+    """
+    formatted = f"""
+Error Type: {error_type}
+Message: {message}
+
+Traceback:
+{traceback}
+"""
+    
+    if code:
+        formatted += f"\nOriginal Code:\n{code}"
+    
+    return formatted
+
+
+def create_prompt(task: str, code: str, error: Optional[str] = None) -> str:
+    """
+    Create optimized prompt for Ollama (CPU-friendly, concise)
     
-    else:
-        prompt = code
+    Args:
+        task: Task description (fix, analyze, create)
+        code: Python code
+        error: Error message (optional)
+        
+    Returns:
+        Formatted prompt
+    """
+    template = _TEMPLATES.get(task)
+    if template is None:
+        return code
     
-    return prompt
+    return template.format(code=code, error=error)
 
 
 def extract_code(response: str) -> str:
@@ -116,18 +128,16 @@ def extract_code(response: str) -> str:
     Returns:
         Extracted Python code
     """
-    # Try to find code blocks
-    if "```python" in response:
-        start = response.find("```python") + 9
-        end = response.find("```", start)
-        if end != -1:
-            return response[start:end].strip()
+    # Try to find code blocks, preferring one tagged as Python
+    first = None
+    for match in _CODE_BLOCK_RE.finditer(response):
+        if (match.group(1) or "").lower() in ("python", "py"):
+            return match.group(2).strip()
+        if first is None:
+            first = match.group(2).strip()
     
-    if "```" in response:
-        start = response.find("```") + 3
-        end = response.find("```", start)
-        if end != -1:
-            return response[start:end].strip()
+    if first is not None:
+        return first
     
     # If no code blocks, return as is
     return response.strip()
@@ -141,6 +151,15 @@ def display_code(code: str, title: str = "Code"):
         code: Python code to display
         title: Display title
     """
+    # Highlighting large blobs costs more than it's worth: print them plain
+    if len(code) > _HIGHLIGHT_LIMIT:
+        console.rule(title, style="cyan")
+        console.print(code, markup=False, highlight=False)
+        return
+    
+    # Imported here so Pygments only loads when something is highlighted
+    from rich.syntax import Syntax
+    
     syntax = Syntax(code, "python", theme="monokai", line_numbers=True)
     console.print(Panel(syntax, title=title, border_style="cyan"))
 
@@ -201,10 +220,8 @@ def format_traceback(traceback: str) -> str:
     Returns:
         Formatted traceback
     """
-    lines = traceback.strip().split('\n')
-    
-    # Keep last 10 lines (most relevant)
-    if len(lines) > 10:
-        lines = lines[-10:]
+    # Keep last 10 lines (most relevant); rsplit stops after 10 splits
+    # from the end instead of splitting the whole traceback
+    lines = traceback.strip().rsplit('\n', 10)[-10:]
     
     return '\n'.join(lines)
\ No newline at end of file
@@ -0,0 +1,538 @@
+"""
+Python Worker - Persistent interpreter for running code
+Pays Python startup once instead of on every execution; each job runs in
+a forked copy of the worker, so nothing it changes outlives it
+"""
+
+import atexit
+import builtins
+import codecs
+import ctypes
+import io
+import json
+import linecache
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import types
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+_WORKER_SCRIPT = os.path.abspath(__file__)
+
+# Pending output is sent this often (seconds), or sooner once this large
+_FRAME_INTERVAL = 0.05
+_FRAME_SIZE = 64 * 1024
+
+# C library, to flush its stdio buffers before a forked job's os._exit
+_LIBC = ctypes.CDLL(None) if hasattr(os, "fork") else None
+
+# Receives ("stdout" | "stderr", text) while code runs
+OutputCallback = Callable[[str, str], None]
+
+# Popen arguments giving a child its own process group, so killing it
+# also reaches any processes the user's code started
+if os.name == "nt":
+    PROCESS_GROUP = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    PROCESS_GROUP = {"start_new_session": True}
+
+
+def kill_process_group(pid: int):
+    """
+    Kill a child started with PROCESS_GROUP together with its descendants
+
+    Args:
+        pid: Process id of the child (also its process group id on POSIX)
+    """
+    if os.name == "nt":
+        subprocess.run(
+            ["taskkill", "/F", "/T", "/PID", str(pid)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        return
+
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        # Group already gone
+        pass
+
+
+class JobResult(NamedTuple):
+    """Outcome of PythonWorker.run_job"""
+    success: bool
+    stdout: str
+    stderr: str
+    # False when the code didn't get to finish: a timeout, or the worker
+    # couldn't be started or reached. The result then says nothing about
+    # the code itself
+    completed: bool
+
+
+class PythonWorker:
+    """Run Python code in a long-lived child interpreter"""
+
+    def __init__(self):
+        """Initialize worker (the child process starts on first use)"""
+        self._proc: Optional[subprocess.Popen] = None
+        self._replies: Optional[queue.Queue] = None
+        self._lock = threading.Lock()
+
+    def run(
+        self,
+        code: str,
+        timeout: float,
+        filename: str = "<stdin>",
+        on_output: Optional[OutputCallback] = None
+    ) -> Tuple[bool, str, str]:
+        """
+        Execute code in the worker
+
+        Same as run_job, without the completed flag
+
+        Returns:
+            Tuple of (success, stdout, stderr)
+        """
+        success, stdout, stderr, _ = self.run_job(code, timeout, filename, on_output)
+        return success, stdout, stderr
+
+    def run_job(
+        self,
+        code: str,
+        timeout: float,
+        filename: str = "<stdin>",
+        on_output: Optional[OutputCallback] = None
+    ) -> JobResult:
+        """
+        Execute code in the worker
+
+        Args:
+            code: Python code to execute
+            timeout: Max execution time in seconds
+            filename: Name shown in tracebacks. A real path also sets
+                __file__, sys.argv and sys.path[0] as `python <file>` would
+            on_output: Called with ("stdout" | "stderr", text) as output
+                arrives, while the code is still running
+
+        Returns:
+            JobResult with success, stdout, stderr and completed
+        """
+        output = {"stdout": [], "stderr": []}
+
+        def emit(stream: str, text: str):
+            output[stream].append(text)
+            if on_output is not None:
+                on_output(stream, text)
+
+        def report(message: str):
+            # On a line of its own, even after partial stderr from the job
+            stderr = output["stderr"]
+            if stderr and not stderr[-1].endswith("\n"):
+                message = "\n" + message
+            emit("stderr", message)
+
+        def result(success: bool, completed: bool = True) -> JobResult:
+            return JobResult(
+                success,
+                "".join(output["stdout"]),
+                "".join(output["stderr"]),
+                completed
+            )
+
+        with self._lock:
+            try:
+                if self._proc is None or self._proc.poll() is not None:
+                    self._start()
+
+                deadline = time.monotonic() + timeout
+                request = json.dumps({"code": code, "filename": filename})
+                self._proc.stdin.write(request + "\n")
+                self._proc.stdin.flush()
+
+                # Output frames until the final {"returncode": ...} reply
+                while True:
+                    reply = self._replies.get(timeout=max(0, deadline - time.monotonic()))
+                    if reply is None or "returncode" in reply:
+                        break
+                    emit(reply["stream"], reply["data"])
+
+            except queue.Empty:
+                # Stuck in user code: kill it, a fresh worker starts next run
+                self._stop()
+                report(f"Execution timed out after {timeout} seconds")
+                return result(False, completed=False)
+
+            except Exception as e:
+                # Worker can't be started or reached (Popen failure, broken pipe)
+                self._stop()
+                report(f"Execution error: {str(e)}")
+                return result(False, completed=False)
+
+            if reply is None:
+                # Worker itself died mid-run (without fork the job runs in it,
+                # so os._exit or a crash in an extension ends it)
+                returncode = self._proc.wait()
+                self._stop()
+                if returncode != 0:
+                    report(f"Process exited with code {returncode}")
+                return result(returncode == 0)
+
+            if reply.get("respawn"):
+                self._stop()
+
+            return result(reply["returncode"] == 0)
+
+    def close(self):
+        """Shut down the child interpreter"""
+        with self._lock:
+            self._stop()
+
+    def _start(self):
+        """Spawn the child interpreter and its reply reader"""
+        self._proc = subprocess.Popen(
+            # No -I: PYTHONPATH and user site-packages must reach the code,
+            # as they would for `python <file>`
+            [sys.executable, '-u', _WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding='utf-8',
+            **PROCESS_GROUP
+        )
+        self._replies = queue.Queue()
+
+        threading.Thread(
+            target=self._read_replies,
+            args=(self._proc.stdout, self._replies),
+            daemon=True
+        ).start()
+
+    def _stop(self):
+        """Kill the child interpreter and anything it spawned"""
+        if self._proc is None:
+            return
+
+        # Even if the worker itself has exited, its children may not have
+        kill_process_group(self._proc.pid)
+        self._proc.wait()
+
+        self._proc.stdin.close()
+        self._proc = None
+
+    @staticmethod
+    def _read_replies(stream, replies: queue.Queue):
+        """Forward each reply line to the queue; None marks worker exit"""
+        for line in stream:
+            replies.put(json.loads(line))
+        replies.put(None)
+
+
+class _Output:
+    """
+    Job output sent to the parent as ordered, batched frames
+
+    Writes are buffered so a print-heavy job doesn't cost one frame per
+    print; a background thread sends whatever is pending every
+    _FRAME_INTERVAL, and a write flushes straight away past _FRAME_SIZE.
+    """
+
+    def __init__(self, send: Callable[[dict], None]):
+        self._send = send
+        self._pending: List[List[str]] = []
+        self._size = 0
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    def write(self, stream: str, text: str):
+        if not text:
+            return
+
+        with self._lock:
+            if self._pending and self._pending[-1][0] == stream:
+                self._pending[-1][1] += text
+            else:
+                self._pending.append([stream, text])
+            self._size += len(text)
+            full = self._size >= _FRAME_SIZE
+
+        if full:
+            self.flush()
+
+    def flush(self):
+        # Send under the lock so frames from both threads stay in order
+        with self._lock:
+            for stream, text in self._pending:
+                self._send({"stream": stream, "data": text})
+            self._pending = []
+            self._size = 0
+
+    def close(self):
+        """Stop the flusher thread and send anything still pending"""
+        self._done.set()
+        self._flusher.join()
+        self.flush()
+
+    def _flush_periodically(self):
+        while not self._done.wait(_FRAME_INTERVAL):
+            self.flush()
+
+
+class _OutputBuffer(io.BufferedIOBase):
+    """
+    Binary layer under the job's sys.stdout / sys.stderr, feeding an _Output
+
+    fileno() is the real descriptor, which _capture_fd points at a pipe, so
+    code handing sys.stdout to a subprocess or faulthandler still works.
+    """
+
+    def __init__(self, output: _Output, stream: str, fd: int):
+        self._output = output
+        self._stream = stream
+        self._fd = fd
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._output.write(self._stream, self._decoder.decode(data))
+        return len(data)
+
+    def flush(self):
+        self._output.flush()
+
+    def fileno(self) -> int:
+        return self._fd
+
+
+def _output_stream(output: _Output, stream: str, fd: int, errors: str) -> io.TextIOWrapper:
+    """Text stream with the attributes code expects of sys.stdout / sys.stderr"""
+    # write_through: text goes straight to the buffer, _Output does the batching
+    return io.TextIOWrapper(
+        _OutputBuffer(output, stream, fd),
+        encoding='utf-8',
+        errors=errors,
+        write_through=True
+    )
+
+
+def _exit_code(exc: SystemExit, stderr: io.TextIOWrapper) -> int:
+    """Translate SystemExit the same way the interpreter does"""
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    print(exc.code, file=stderr)
+    return 1
+
+
+# Pipe ends as returned by os.pipe()
+Pipe = Tuple[int, int]
+
+
+def _capture_fd(fd: int, stream: str, output: _Output, pipe: Pipe) -> threading.Thread:
+    """
+    Point fd at a pipe whose contents are forwarded to output
+
+    Catches what bypasses sys.stdout / sys.stderr: os.system, child
+    processes and C extensions writing to the file descriptor directly.
+    """
+    read_end, write_end = pipe
+    os.dup2(write_end, fd)
+    os.close(write_end)
+
+    reader = threading.Thread(
+        target=_forward_pipe,
+        args=(read_end, stream, output),
+        daemon=True
+    )
+    reader.start()
+    return reader
+
+
+def _forward_pipe(read_end: int, stream: str, output: _Output):
+    """Copy a capture pipe into output until every writer has closed it"""
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    with open(read_end, 'rb', buffering=0) as pipe:
+        for data in iter(lambda: pipe.read(_FRAME_SIZE), b''):
+            # Sent right away: a job ending in os._exit takes unsent
+            # output with it
+            output.write(stream, decoder.decode(data))
+            output.flush()
+    output.write(stream, decoder.decode(b'', final=True))
+
+
+def _drain_pipes(pipes: List[Pipe], send: Callable[[dict], None]):
+    """
+    Send what a job that died abruptly left unread in its capture pipes
+
+    A segfault takes the job's reader threads with it, but a crash dump
+    written just before (faulthandler, C assertions) is still in the pipe.
+    """
+    for (read_end, _), stream in zip(pipes, ("stdout", "stderr")):
+        os.set_blocking(read_end, False)
+        chunks = []
+        try:
+            for data in iter(lambda: os.read(read_end, _FRAME_SIZE), b''):
+                chunks.append(data)
+        except BlockingIOError:
+            # A background process still holds the pipe open
+            pass
+        os.close(read_end)
+
+        if chunks:
+            send({"stream": stream, "data": b''.join(chunks).decode('utf-8', 'replace')})
+
+
+def _release_fds(readers: List[threading.Thread]):
+    """Close the job's ends of the capture pipes and wait for them to drain"""
+    if _LIBC is not None:
+        _LIBC.fflush(None)
+
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    for fd in (1, 2):
+        os.dup2(devnull, fd)
+    os.close(devnull)
+
+    # Background processes still holding a pipe keep the job running,
+    # as they would keep subprocess.run(capture_output=True) waiting
+    for reader in readers:
+        reader.join()
+
+
+def _join_threads():
+    """Wait for every non-daemon thread the job started (and those they start)"""
+    current = threading.current_thread()
+    while True:
+        pending = [t for t in threading.enumerate() if t is not current and not t.daemon]
+        if not pending:
+            return
+        for thread in pending:
+            thread.join()
+
+
+def _execute(code: str, filename: str, send: Callable[[dict], None], pipes: List[Pipe]) -> int:
+    """
+    Run one job as a fresh __main__ module, streaming its output
+
+    Only called in a process that exits once the job is done, so the job's
+    changes to the interpreter (cwd, environ, builtins, imported modules,
+    threads) never need undoing. pipes capture fds 1 and 2.
+    """
+    output = _Output(send)
+    readers = [
+        _capture_fd(1, "stdout", output, pipes[0]),
+        _capture_fd(2, "stderr", output, pipes[1])
+    ]
+    stdout = _output_stream(output, "stdout", 1, 'strict')
+    stderr = _output_stream(output, "stderr", 2, 'backslashreplace')
+    # A real module in sys.modules, as `python <file>` runs it: pickle,
+    # multiprocessing and friends look objects up through __main__
+    main = types.ModuleType("__main__")
+    main.__builtins__ = builtins
+    sys.modules["__main__"] = main
+    namespace = main.__dict__
+
+    # Let tracebacks show source lines for code that has no file on disk
+    linecache.cache[filename] = (len(code), None, code.splitlines(True), filename)
+
+    sys.stdin, sys.stdout, sys.stderr = io.StringIO(), stdout, stderr
+
+    if filename == "<stdin>":
+        sys.argv = ['-']
+    else:
+        # Run like `python <file>`: the script's directory is importable
+        namespace["__file__"] = filename
+        sys.argv = [filename]
+        sys.path[0] = os.path.dirname(filename)
+
+    returncode = 0
+
+    try:
+        exec(compile(code, filename, 'exec'), namespace)
+
+    except SystemExit as e:
+        returncode = _exit_code(e, stderr)
+
+    except BaseException:
+        # Skip this frame so the traceback starts at the user's code
+        etype, value, tb = sys.exc_info()
+        traceback.print_exception(etype, value, tb.tb_next, file=stderr)
+        returncode = 1
+
+    finally:
+        # Finish the way the interpreter does at exit: wait for non-daemon
+        # threads, then run atexit handlers
+        _join_threads()
+        atexit._run_exitfuncs()
+        _release_fds(readers)
+        output.close()
+
+    return returncode
+
+
+def _serve():
+    """Worker loop: one JSON request per line in; output frames, then a result, out"""
+    # Keep the protocol on private copies of stdin/stdout so that output
+    # written straight to fd 1 (os.system, child processes) can't corrupt
+    # it; jobs capture fds 1 and 2 through pipes of their own
+    requests = os.fdopen(os.dup(0), 'r', encoding='utf-8')
+    replies = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+
+    # Match `python -`: the working directory is importable, not this
+    # script's own directory (src/, whose modules would shadow the user's).
+    # Either way sys.path[0] is now the slot _execute points at a script
+    if sys.path and sys.path[0] == os.path.dirname(_WORKER_SCRIPT):
+        sys.path[0] = ''
+    else:
+        # PYTHONSAFEPATH: nothing was put in front
+        sys.path.insert(0, '')
+
+    def send(message: dict):
+        replies.write(json.dumps(message) + "\n")
+        replies.flush()
+
+    for line in requests:
+        request = json.loads(line)
+        pipes = [os.pipe(), os.pipe()]
+
+        if not hasattr(os, "fork"):
+            # No fork (Windows): run the job here and exit; the parent
+            # starts a fresh worker for the next one
+            returncode = _execute(request["code"], request["filename"], send, pipes)
+            send({"returncode": returncode, "respawn": True})
+            return
+
+        pid = os.fork()
+        if pid == 0:
+            returncode = 1
+            try:
+                returncode = _execute(request["code"], request["filename"], send, pipes)
+            finally:
+                # Never fall back into the serve loop from the child
+                os._exit(returncode)
+
+        # Keep only the read ends, so the pipes close once the job is done
+        for _, write_end in pipes:
+            os.close(write_end)
+
+        _, status = os.waitpid(pid, 0)
+        _drain_pipes(pipes, send)
+        send({"returncode": os.waitstatus_to_exitcode(status)})
+
+
+if __name__ == "__main__":
+    _serve()
@@ -0,0 +1,334 @@
+"""
+Tests for the persistent Python worker
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+from src import worker as worker_module
+from src.worker import PythonWorker
+
+posix_only = pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+
+
+@pytest.fixture
+def worker():
+    """A fresh worker, shut down after the test"""
+    w = PythonWorker()
+    yield w
+    w.close()
+
+
+def _merged(events):
+    """Join consecutive output events from the same stream"""
+    merged = []
+    for stream, text in events:
+        if merged and merged[-1][0] == stream:
+            merged[-1] = (stream, merged[-1][1] + text)
+        else:
+            merged.append((stream, text))
+    return merged
+
+
+# Basics
+
+def test_runs_code_and_captures_output(worker):
+    assert worker.run("print('hi')", timeout=5) == (True, "hi\n", "")
+
+
+def test_exception_reports_traceback_from_user_code(worker):
+    success, stdout, stderr = worker.run("1 / 0", timeout=5)
+
+    assert not success
+    assert stderr.startswith("Traceback (most recent call last):\n  File \"<stdin>\"")
+    assert stderr.rstrip().endswith("ZeroDivisionError: division by zero")
+    assert "worker.py" not in stderr
+
+
+@pytest.mark.parametrize("code, success, stderr", [
+    ("raise SystemExit", True, ""),
+    ("raise SystemExit(0)", True, ""),
+    ("raise SystemExit(3)", False, ""),
+    ("raise SystemExit('bye')", False, "bye\n"),
+    ("import sys; sys.exit(None)", True, ""),
+])
+def test_system_exit_codes(worker, code, success, stderr):
+    assert worker.run(code, timeout=5) == (success, "", stderr)
+
+
+def test_os_exit_ends_only_the_job(worker):
+    assert worker.run("import os; os._exit(4)", timeout=5)[0] is False
+    assert worker.run("print(1)", timeout=5) == (True, "1\n", "")
+
+
+def test_interleaved_stdout_and_stderr_keep_their_order(worker):
+    events = []
+    code = (
+        "import sys\n"
+        "for i in range(3):\n"
+        "    print('out', i)\n"
+        "    print('err', i, file=sys.stderr)\n"
+    )
+
+    worker.run(code, timeout=5, on_output=lambda stream, text: events.append((stream, text)))
+
+    assert _merged(events) == [
+        ("stdout", "out 0\n"), ("stderr", "err 0\n"),
+        ("stdout", "out 1\n"), ("stderr", "err 1\n"),
+        ("stdout", "out 2\n"), ("stderr", "err 2\n"),
+    ]
+
+
+def test_output_streams_while_code_runs(worker):
+    first_output = []
+    code = "import time\nprint('early', flush=True)\ntime.sleep(1)"
+
+    start = time.monotonic()
+    worker.run(code, timeout=5, on_output=lambda *_: first_output.append(time.monotonic()))
+    finished = time.monotonic()
+
+    assert first_output
+    assert finished - first_output[0] > 0.5
+    assert first_output[0] - start < 0.5
+
+
+# Timeouts and failures
+
+def test_timeout_then_respawn(worker):
+    success, stdout, stderr = worker.run("print('partial')\nwhile True: pass", timeout=1)
+
+    assert not success
+    assert stdout == "partial\n"
+    assert stderr == "Execution timed out after 1 seconds"
+    assert worker.run("print('again')", timeout=5) == (True, "again\n", "")
+
+
+def test_timeout_message_starts_its_own_line(worker):
+    code = "import sys, time\nsys.stderr.write('partial')\ntime.sleep(10)"
+
+    success, _, stderr = worker.run(code, timeout=1)
+
+    assert not success
+    assert stderr == "partial\nExecution timed out after 1 seconds"
+
+
+@posix_only
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc")
+def test_timeout_kills_processes_the_code_started(worker):
+    code = (
+        "import subprocess\n"
+        "p = subprocess.Popen(['sleep', '60'])\n"
+        "print(p.pid, flush=True)\n"
+        "while True: pass\n"
+    )
+
+    success, stdout, _ = worker.run(code, timeout=1)
+    pid = int(stdout.split()[0])
+    time.sleep(0.2)
+
+    assert not success
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Killed, possibly not yet reaped by init
+            assert f.read().split()[2] == "Z"
+    except FileNotFoundError:
+        pass
+
+
+def test_failure_to_start_is_reported(worker, monkeypatch):
+    monkeypatch.setattr(worker_module.sys, "executable", "/nonexistent/python")
+
+    success, stdout, stderr = worker.run("print(1)", timeout=5)
+
+    assert not success
+    assert stderr.startswith("Execution error:")
+
+
+@pytest.mark.parametrize("code, completed", [
+    ("print(1)", True),
+    ("1 / 0", True),
+    ("raise SystemExit(2)", True),
+    ("while True: pass", False),
+])
+def test_run_job_marks_runs_that_did_not_finish(worker, code, completed):
+    assert worker.run_job(code, timeout=1).completed is completed
+
+
+def test_failure_to_start_is_not_completed(worker, monkeypatch):
+    monkeypatch.setattr(worker_module.sys, "executable", "/nonexistent/python")
+    assert worker.run_job("print(1)", timeout=5).completed is False
+
+
+# Jobs run like `python <file>`
+
+def test_file_runs_as_real_main_module(worker, tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text(
+        '"""Docstring"""\n'
+        "import pickle, sys\n"
+        "class A: pass\n"
+        "print(type(pickle.loads(pickle.dumps(A()))).__name__)\n"
+        "print(sys.modules['__main__'].__doc__)\n"
+        "print(__file__ == sys.argv[0])\n"
+    )
+
+    result = worker.run(script.read_text(), timeout=5, filename=str(script))
+
+    assert result == (True, "A\nDocstring\nTrue\n", "")
+
+
+@posix_only
+def test_multiprocessing_pool_finds_main_functions(worker, tmp_path):
+    script = tmp_path / "pool.py"
+    script.write_text(
+        "import multiprocessing\n"
+        "def square(x): return x * x\n"
+        "if __name__ == '__main__':\n"
+        "    with multiprocessing.get_context('fork').Pool(2) as pool:\n"
+        "        print(pool.map(square, range(4)))\n"
+    )
+
+    result = worker.run(script.read_text(), timeout=10, filename=str(script))
+
+    assert result == (True, "[0, 1, 4, 9]\n", "")
+
+
+def test_atexit_handlers_run(worker):
+    code = "import atexit\natexit.register(print, 'atexit ran')\nprint('main')"
+    assert worker.run(code, timeout=5) == (True, "main\natexit ran\n", "")
+
+
+def test_non_daemon_threads_are_joined(worker):
+    code = (
+        "import threading, time\n"
+        "def late():\n"
+        "    time.sleep(0.3)\n"
+        "    print('thread done')\n"
+        "threading.Thread(target=late).start()\n"
+        "print('main done')\n"
+    )
+
+    assert worker.run(code, timeout=5) == (True, "main done\nthread done\n", "")
+
+
+def test_edited_helper_module_is_reloaded(worker, tmp_path):
+    helper = tmp_path / "helper.py"
+    script = tmp_path / "main.py"
+    script.write_text("import helper\nprint(helper.VALUE)\n")
+
+    helper.write_text("VALUE = 1\n")
+    first = worker.run(script.read_text(), timeout=5, filename=str(script))
+    # A different size: .pyc files are checked against source mtime (in
+    # whole seconds) and size, so a same-size edit within a second would
+    # look unchanged to any interpreter
+    helper.write_text("VALUE = 22\n")
+    second = worker.run(script.read_text(), timeout=5, filename=str(script))
+
+    assert first == (True, "1\n", "")
+    assert second == (True, "22\n", "")
+
+
+def test_pythonpath_and_working_directory_are_importable(worker, tmp_path, monkeypatch):
+    lib = tmp_path / "lib"
+    lib.mkdir()
+    (lib / "helpermod.py").write_text("X = 42\n")
+    monkeypatch.setenv("PYTHONPATH", str(lib))
+
+    code = (
+        "import sys, helpermod\n"
+        "print(helpermod.X)\n"
+        "print(sys.path[0])\n"
+        "import tools\n"
+    )
+    success, stdout, stderr = worker.run(code, timeout=5)
+
+    # The worker's own src/ directory is not on sys.path
+    assert not success
+    assert stdout == "42\n\n"
+    assert "No module named 'tools'" in stderr
+
+
+def test_pythonpath_reaches_file_jobs(worker, tmp_path, monkeypatch):
+    lib = tmp_path / "lib"
+    lib.mkdir()
+    (lib / "helpermod.py").write_text("X = 42\n")
+    script = tmp_path / "main_s.py"
+    script.write_text("import helpermod; print(helpermod.X)\n")
+    monkeypatch.setenv("PYTHONPATH", str(lib))
+
+    result = worker.run(script.read_text(), timeout=5, filename=str(script))
+
+    assert result == (True, "42\n", "")
+
+
+# Nothing leaks from one job into the next
+
+@pytest.mark.parametrize("change, check, expected", [
+    ("import os; os.chdir(os.path.dirname(os.getcwd()) or '/')",
+     "import os; print(os.getcwd())", os.getcwd()),
+    ("import os; os.environ['WORKER_TEST'] = '1'",
+     "import os; print(os.environ.get('WORKER_TEST'))", "None"),
+    ("import builtins; builtins.print = lambda *a, **k: None",
+     "print('visible')", "visible"),
+    ("import math; math.pi = 3",
+     "import math; print(math.pi)", "3.141592653589793"),
+])
+def test_state_does_not_carry_into_next_job(worker, change, check, expected):
+    assert worker.run(change, timeout=5)[0]
+    assert worker.run(check, timeout=5) == (True, f"{expected}\n", "")
+
+
+def test_background_thread_output_stays_in_its_job(worker):
+    leak = (
+        "import threading, time\n"
+        "def spam():\n"
+        "    for i in range(4):\n"
+        "        print('A-leak', i)\n"
+        "        time.sleep(0.1)\n"
+        "threading.Thread(target=spam, daemon=True).start()\n"
+    )
+
+    worker.run(leak, timeout=5)
+    success, stdout, _ = worker.run("import time; time.sleep(0.5); print('B')", timeout=5)
+
+    assert (success, stdout) == (True, "B\n")
+
+
+# Output that bypasses sys.stdout / sys.stderr
+
+@posix_only
+def test_fd_level_output_is_captured(worker):
+    code = (
+        "import os, subprocess, sys\n"
+        "os.system('echo from-system')\n"
+        "subprocess.run([sys.executable, '-c', 'import sys; sys.stderr.write(\"from-child\")'])\n"
+    )
+
+    assert worker.run(code, timeout=10) == (True, "from-system\n", "from-child")
+
+
+@posix_only
+def test_crash_dump_is_kept(worker):
+    code = "import ctypes, faulthandler\nfaulthandler.enable()\nctypes.string_at(0)"
+
+    success, _, stderr = worker.run(code, timeout=10)
+
+    assert not success
+    assert "Segmentation fault" in stderr
+
+
+def test_streams_have_file_attributes(worker):
+    code = (
+        "import faulthandler, subprocess, sys\n"
+        "faulthandler.enable()\n"
+        "sys.stdout.buffer.write(b'raw\\n')\n"
+        "sys.stdout.flush()\n"
+        "print(sys.stdout.encoding.lower(), sys.stdout.fileno(), sys.stderr.fileno())\n"
+        "sys.stdout.flush()\n"
+        "subprocess.run([sys.executable, '-c', 'print(\"child\")'], stdout=sys.stdout)\n"
+    )
+
+    assert worker.run(code, timeout=10) == (True, "raw\nutf-8 1 2\nchild\n", "")
\ No newline at end of file